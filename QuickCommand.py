@@ -1,8 +1,21 @@
+import functools
+import hashlib
+import hmac
+import heapq
+import itertools
 import json
+import math
 import os
+import queue
+import re
+import secrets
+import socket
 import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
-from tkinter import ttk, Frame, messagebox
+from tkinter import ttk, Frame, messagebox, filedialog
 from ttkthemes import ThemedTk
 import pystray
 import pyautogui
@@ -10,9 +23,942 @@ import keyboard
 import threading
 from PIL import Image
 import pyperclip
+from QuickCommandCLI import IPC_TIMEOUT, ipc_address, runtime_path, send_request
 
 CONFIG_FILE = "button_config.json"
+PAGES_DIR = "button_pages"  # 分片存储：每个页面一个文件，另有记录页面顺序的清单
+PAGES_MANIFEST = os.path.join(PAGES_DIR, "manifest.json")
 HOTKEY_CONFIG = "hotkey_config.json"
+TEMPLATE_CONFIG = "template_config.json"
+USAGE_LOG = "usage_log.jsonl"
+COMMAND_GRAMMAR_FILE = "mc_commands.json"
+EXECUTION_LOG = "execution_log.jsonl"
+
+USAGE_HALF_LIFE = 7 * 24 * 3600  # 使用热度半衰期（秒）
+USAGE_COMPACT_THRESHOLD = 500  # 日志中冗余行超过该值时压缩
+FAVORITE_COUNT = 8
+RECENT_COUNT = 8
+HISTORY_LIMIT = 100  # 最多可撤销的步数
+HISTORY_SLOT_BUDGET = 200000  # 历史快照中非共享引用的总数上限
+EXECUTION_LOG_MAX_BYTES = 1024 * 1024  # 执行日志轮转大小
+EXECUTION_LOG_BACKUPS = 3
+EXECUTION_LOG_BUFFER = 20  # 缓冲条数达到该值时立即写入
+EXECUTION_LOG_FLUSH_MS = 2000  # 定时写入间隔
+LOG_VIEWER_PAGE = 200
+LOG_READ_BLOCK = 64 * 1024
+# 分片读取使用线程池：JSON 解析和校验受 GIL 限制不会真正并行，但文件读取可以重叠。
+# 没有改用进程池，因为子进程需要重新导入本模块（Tk、pyautogui 等），
+# 启动开销远大于校验几个页面的耗时，也会推迟活动页的显示
+SHARD_WORKERS = min(4, os.cpu_count() or 1)
+SHARD_POLL_MS = 20  # 主线程检查后台分片加载结果的间隔
+IPC_POLL_MS = 50  # 主线程检查本地服务转交请求的间隔
+
+# 指令模板占位符，形如 {player}、{x}
+PLACEHOLDER_PATTERN = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+VARIABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+TEMPLATE_HISTORY_LIMIT = 10
+
+# 指令语法中的参数形如 <名称:类型>，其余键为字面量（可用 | 分隔多个别名）
+GRAMMAR_ARG_PATTERN = re.compile(r"^<(\w+):(\w+)>$")
+_NUMBER = r"-?(\d+\.?\d*|\.\d+)"
+_RESOURCE = r"#?[a-z0-9_.-]+(:[a-z0-9_./-]+)?"
+GRAMMAR_TYPES = {
+    # 类型: (占用的参数个数, 单个参数的校验正则)；greedy 占用剩余全部文本
+    "entity": (1, r"@[parse](\[.*\])?|[A-Za-z0-9_]{1,16}|[0-9a-fA-F-]{36}"),
+    "int": (1, r"-?\d+"),
+    "float": (1, _NUMBER),
+    "bool": (1, r"true|false"),
+    "pos": (3, r"[~^]?(" + _NUMBER + r")?"),
+    "vec2": (2, r"~?(" + _NUMBER + r")?"),
+    "rotation": (2, r"~?(" + _NUMBER + r")?"),
+    "id": (1, _RESOURCE),
+    "block": (1, _RESOURCE + r"(\[.*\])?(\{.*\})?"),
+    "item": (1, _RESOURCE + r"(\[.*\])?(\{.*\})?"),
+    "time": (1, r"\d+(\.\d+)?[dst]?"),
+    "range": (1, r"-?\d*(\.\.)?-?\d*"),
+    "word": (1, r"\S+"),
+    "greedy": (None, r".*"),
+}
+GRAMMAR_VALIDATORS = {
+    name: re.compile(pattern) for name, (_, pattern) in GRAMMAR_TYPES.items()}
+ENTITY_SELECTORS = ("@a", "@e", "@p", "@r", "@s")
+COMPLETION_LIMIT = 8
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_template(command):
+    """将指令模板编译为片段元组（按指令文本缓存，只解析一次）
+
+    返回 (segments, params)：segments 中的字符串为字面量，单元素元组为占位符；
+    params 为按首次出现顺序去重后的占位符名称。
+    """
+    segments = []
+    params = []
+    pos = 0
+    for match in PLACEHOLDER_PATTERN.finditer(command):
+        if match.start() > pos:
+            segments.append(command[pos:match.start()])
+        name = match.group(1)
+        segments.append((name,))
+        if name not in params:
+            params.append(name)
+        pos = match.end()
+    if pos < len(command):
+        segments.append(command[pos:])
+    return tuple(segments), tuple(params)
+
+
+def render_template(segments, values):
+    """按编译后的片段拼接出最终指令"""
+    return "".join(
+        seg if isinstance(seg, str) else values[seg[0]] for seg in segments)
+
+
+def new_button_id():
+    """生成按钮的稳定标识"""
+    return uuid.uuid4().hex[:8]
+
+
+def new_page(page_name, buttons=None):
+    """创建页面配置（页面id在分片存储时作为文件名）"""
+    return {
+        "id": uuid.uuid4().hex[:8],
+        "page_name": page_name,
+        "buttons": buttons if buttons is not None else []
+    }
+
+
+def same_buttons(saved, buttons):
+    """按引用比较按钮序列（按钮修改时总是整体替换字典，从不原地修改）"""
+    return len(saved) == len(buttons) and all(
+        a is b for a, b in zip(saved, buttons))
+
+
+def validate_page(page):
+    """校验并清理单个页面配置，无效时返回 None
+
+    按钮缺少的id留空，由 dedupe_button_ids 统一生成。
+    """
+    if not isinstance(page, dict) or "page_name" not in page \
+            or not isinstance(page.get("buttons"), list):
+        return None
+    buttons = [{
+        "id": btn.get("id") or None,
+        "name": btn["name"],
+        "command": btn["command"]
+    } for btn in page["buttons"]
+        if isinstance(btn, dict) and "name" in btn and "command" in btn]
+    result = new_page(page["page_name"], buttons)
+    if page.get("id"):
+        result["id"] = page["id"]
+    return result
+
+
+def dedupe_button_ids(pages, seen_ids):
+    """为缺少id或与 seen_ids、彼此重复的按钮生成新id，有id变化时返回 True"""
+    changed = False
+    for page in pages:
+        for idx, btn in enumerate(page["buttons"]):
+            if not btn["id"] or btn["id"] in seen_ids:
+                btn = page["buttons"][idx] = {**btn, "id": new_button_id()}
+                changed = True
+            seen_ids.add(btn["id"])
+    return changed
+
+
+def shard_path(page_id):
+    return os.path.join(PAGES_DIR, f"page_{page_id}.json")
+
+
+def load_shard(page_id):
+    """读取并校验一个页面分片（在线程池中执行）"""
+    with open(shard_path(page_id), 'r', encoding='utf-8') as f:
+        page = validate_page(json.load(f))
+    if page is None:
+        raise ValueError("页面文件格式错误")
+    page["id"] = page_id
+    return page
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，避免写入中断导致文件损坏"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def normalize_command(command):
+    """规范化指令文本（去掉前导"/"并合并空白），用于去重"""
+    return " ".join(command.strip().lstrip("/").split())
+
+
+def command_hash(command):
+    """计算规范化指令的哈希，作为去重索引的键"""
+    return hashlib.blake2b(
+        normalize_command(command).encode('utf-8'), digest_size=8).digest()
+
+
+def iter_mcfunction(path, page_name):
+    """逐行读取 .mcfunction 文件，生成 (页面名称, 按钮名称, 指令)
+
+    "## 标题" 开始一个新分区并映射为同名页面，
+    紧邻指令上方的 "# 注释" 作为按钮名称，否则使用指令开头作为名称。
+    """
+    label = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                label = None
+            elif line.startswith("## "):
+                page_name = line[3:].strip() or page_name
+                label = None
+            elif line.startswith("#"):
+                label = line.lstrip("#").strip() or None
+            else:
+                command = line.lstrip("/")
+                yield page_name, label or command[:20], command
+                label = None
+
+
+def iter_import_source(path):
+    """遍历导入来源，生成 (页面名称, 按钮名称, 指令)
+
+    目录中的 .mcfunction 文件按所在子目录映射页面；
+    单个 .mcfunction 文件以文件名为默认页面；.json 为本程序的配置格式。
+    """
+    if os.path.isdir(path):
+        root_name = os.path.basename(os.path.normpath(path))
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            rel_path = os.path.relpath(dirpath, path)
+            page_name = root_name if rel_path == "." else rel_path.replace(
+                os.sep, "/")
+            for filename in sorted(filenames):
+                if filename.endswith(".mcfunction"):
+                    yield from iter_mcfunction(
+                        os.path.join(dirpath, filename), page_name)
+    elif path.lower().endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError("配置文件格式错误")
+        for page in data:
+            if "page_name" not in page or "buttons" not in page:
+                continue
+            for btn in page["buttons"]:
+                if "name" in btn and "command" in btn:
+                    yield page["page_name"], btn["name"], btn["command"]
+    else:
+        default_page = os.path.splitext(os.path.basename(path))[0]
+        yield from iter_mcfunction(path, default_page)
+
+
+def export_mcfunction(pages, path):
+    """逐页写出 .mcfunction（格式与导入一致，可再次导入）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for page in pages:
+            f.write(f"## {page['page_name']}\n")
+            for btn in page["buttons"]:
+                f.write(f"# {btn['name']}\n{btn['command']}\n")
+            f.write("\n")
+
+
+def export_json(pages, path):
+    """逐个按钮写出 JSON 配置，不在内存中拼接整个文档"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for page_idx, page in enumerate(pages):
+            f.write("," if page_idx else "")
+            f.write('\n  {"page_name": %s, "buttons": [' % json.dumps(
+                page["page_name"], ensure_ascii=False))
+            for btn_idx, btn in enumerate(page["buttons"]):
+                f.write("," if btn_idx else "")
+                f.write("\n    " + json.dumps({
+                    "name": btn["name"],
+                    "command": btn["command"]
+                }, ensure_ascii=False))
+            f.write("\n  ]}")
+        f.write("\n]\n")
+
+
+def tokenize_command(text):
+    """按空白切分指令，方括号、花括号和引号内的空白不切分
+
+    返回 (已完成的参数列表, 正在输入的参数)，以空白结尾时后者为空字符串。
+    """
+    tokens = []
+    current = []
+    depth = 0
+    quote = None
+    for ch in text:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}":
+            depth = max(0, depth - 1)
+        elif ch.isspace() and depth == 0:
+            if current:
+                tokens.append("".join(current))
+                current = []
+            continue
+        current.append(ch)
+    return tokens, "".join(current)
+
+
+class PrefixTrie:
+    """前缀树，每个节点缓存其下按字母序排列的前若干个词，补全时只需沿前缀走一遍"""
+
+    __slots__ = ("children", "words")
+
+    def __init__(self, words=()):
+        self.children = {}
+        self.words = []
+        for word in sorted(words):
+            node = self
+            node._collect(word)
+            for ch in word:
+                node = node.children.setdefault(ch, PrefixTrie())
+                node._collect(word)
+
+    def _collect(self, word):
+        if len(self.words) < COMPLETION_LIMIT:
+            self.words.append(word)
+
+    def complete(self, prefix):
+        node = self
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.words
+
+
+class GrammarNode:
+    """语法树节点：字面量子指令、参数分支及是否可在此结束"""
+
+    __slots__ = ("literals", "trie", "args", "executable", "redirect")
+
+    def __init__(self):
+        self.literals = {}
+        self.trie = None
+        self.args = []  # (提示文字, 类型, 子节点)
+        self.executable = False
+        self.redirect = None  # 后续参数改由该节点匹配（如 execute ... run）
+
+    @property
+    def branches(self):
+        return self.redirect or self
+
+
+class CommandGrammar:
+    """由语法数据文件编译出的指令语法树，用于补全和校验指令"""
+
+    def __init__(self, data):
+        redirects = []
+        self.root = self._compile(data["commands"], redirects)
+        for node, target in redirects:
+            node.redirect = (self.root if target == "root"
+                             else self.root.literals.get(target))
+
+    def _compile(self, spec, redirects):
+        node = GrammarNode()
+        node.executable = bool(spec.get("$"))
+        if "$redirect" in spec:
+            redirects.append((node, spec["$redirect"]))
+        for key, child_spec in spec.items():
+            if key.startswith("$"):
+                continue
+            child = self._compile(child_spec, redirects)
+            match = GRAMMAR_ARG_PATTERN.match(key)
+            if match:
+                arg_type = match.group(2)
+                if arg_type not in GRAMMAR_TYPES:
+                    arg_type = "word"
+                node.args.append((key, arg_type, child))
+            else:
+                for literal in key.split("|"):
+                    node.literals[literal] = child
+        node.trie = PrefixTrie(node.literals)
+        return node
+
+    @staticmethod
+    def _token_matches(arg_type, token):
+        return (PLACEHOLDER_PATTERN.fullmatch(token) is not None
+                or GRAMMAR_VALIDATORS[arg_type].fullmatch(token) is not None)
+
+    def analyze(self, text):
+        """分析指令文本
+
+        返回 (状态, 提示文字, 补全候选, 正在输入的参数)，
+        状态为 True（完整有效）、False（无法识别）或 None（尚未输入完整，
+        或是语法文件未收录的指令，无法校验）。
+        """
+        tokens, partial = tokenize_command(text.lstrip().lstrip("/"))
+        count = len(tokens)
+
+        # 按参数位置逐步推进所有可能的匹配状态（参数类型可能有歧义）
+        frontier = {0: [self.root]}
+        in_progress = []  # 正在输入的多参数类型（如坐标）：(类型, 提示, 子节点, 尚缺参数数)
+        greedy_done = False
+        furthest = 0
+        for pos in range(count + 1):
+            nodes = frontier.get(pos)
+            if not nodes:
+                continue
+            furthest = pos
+            if pos == count:
+                break
+            token = tokens[pos]
+            for node in nodes:
+                branches = node.branches
+                targets = []
+                if PLACEHOLDER_PATTERN.fullmatch(token):
+                    targets.extend((1, child)
+                                   for child in branches.literals.values())
+                elif token in branches.literals:
+                    targets.append((1, branches.literals[token]))
+                for label, arg_type, child in branches.args:
+                    size = GRAMMAR_TYPES[arg_type][0]
+                    if size is None:
+                        greedy_done = greedy_done or child.executable
+                        continue
+                    span = tokens[pos:pos + size]
+                    if not all(self._token_matches(arg_type, t) for t in span):
+                        continue
+                    if pos + size <= count:
+                        targets.append((size, child))
+                    else:
+                        in_progress.append(
+                            (arg_type, label, child, pos + size - count))
+                for size, child in targets:
+                    bucket = frontier.setdefault(pos + size, [])
+                    if child not in bucket:
+                        bucket.append(child)
+
+        if greedy_done:
+            return True, "✓ 指令格式正确", [], partial
+
+        nodes = frontier.get(count, [])
+        if not nodes and not in_progress:
+            if self._at_root(frontier[furthest]):
+                return None, f"未收录的指令：{tokens[furthest]}（不做校验）", \
+                    [], partial
+            return False, f"✗ 无法识别：{tokens[furthest]}", [], partial
+
+        completions = []
+        hints = []
+        matched = False
+        # 在当前位置结束时指令是否完整（有正在输入的参数时须由它补齐）
+        complete = not partial and any(node.executable for node in nodes)
+        for arg_type, label, child, remaining in in_progress:
+            hints.append(label)
+            if partial and self._token_matches(arg_type, partial):
+                matched = True
+                complete = complete or (remaining == 1 and child.executable)
+        for node in nodes:
+            branches = node.branches
+            for word in branches.trie.complete(partial):
+                if word not in completions:
+                    completions.append(word)
+            if partial in branches.literals:
+                matched = True
+                complete = complete or branches.literals[partial].executable
+            for label, arg_type, child in branches.args:
+                hints.append(label)
+                if arg_type == "entity":
+                    completions.extend(
+                        sel for sel in ENTITY_SELECTORS
+                        if sel.startswith(partial) and sel not in completions)
+                if partial and self._token_matches(arg_type, partial):
+                    matched = True
+                    size = GRAMMAR_TYPES[arg_type][0]
+                    complete = complete or (
+                        size in (1, None) and child.executable)
+        completions = completions[:COMPLETION_LIMIT]
+
+        if complete:
+            return True, "✓ 指令格式正确", completions, partial
+        if not partial or matched or completions:
+            options = completions + [h for h in hints if h not in completions]
+            return None, "可选：" + " ".join(options[:COMPLETION_LIMIT]), \
+                completions, partial
+        if self._at_root(nodes):
+            return None, f"未收录的指令：{partial}（不做校验）", [], partial
+        return False, f"✗ 无法识别：{partial}", [], partial
+
+    def _at_root(self, nodes):
+        """是否处于指令名位置（语法文件未收录的指令不应判为错误）"""
+        return any(node.branches is self.root for node in nodes)
+
+
+@functools.lru_cache(maxsize=None)
+def load_command_grammar():
+    """加载并编译指令语法（首次打开指令对话框时调用，之后复用）
+
+    语法文件缺失或格式错误时返回 None，此时不提供补全。
+    """
+    try:
+        with open(COMMAND_GRAMMAR_FILE, 'r', encoding='utf-8') as f:
+            return CommandGrammar(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+class UsageStats:
+    """指令使用统计（指数衰减计数 + 最近使用记录）
+
+    日志为追加写入的 JSON 行：{"id", "t"} 表示一次执行，
+    {"id", "t", "score"} 为压缩后的快照。内存中的热度以 self.origin 为基准时刻
+    折算，衰减对所有条目是同一系数，排序时无需再做时间换算。
+    """
+
+    def __init__(self, path, half_life=USAGE_HALF_LIFE):
+        self.path = path
+        self.rate = math.log(2) / half_life
+        self.origin = time.time()
+        self.weights = {}  # 按钮id -> 折算到基准时刻的热度
+        self.recent = OrderedDict()  # 按钮id -> 最后执行时间（按时间先后排列）
+        self.redundant = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def _scale(self, t):
+        return math.exp(self.rate * (t - self.origin))
+
+    def load(self):
+        """回放使用日志"""
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    btn_id, t = entry["id"], float(entry["t"])
+                    score = float(entry.get("score", 1))
+                except (ValueError, KeyError, TypeError):
+                    continue
+                lines += 1
+                if "score" in entry:
+                    self.weights[btn_id] = score * self._scale(t)
+                else:
+                    self.weights[btn_id] = self.weights.get(
+                        btn_id, 0) + self._scale(t)
+                self.recent[btn_id] = t
+                self.recent.move_to_end(btn_id)
+        self.redundant = lines - len(self.weights)
+        if self.redundant > USAGE_COMPACT_THRESHOLD:
+            try:
+                self.compact()
+            except OSError:
+                pass
+
+    def record(self, btn_id):
+        """记录一次执行并追加到日志"""
+        now = time.time()
+        with self.lock:
+            self.weights[btn_id] = self.weights.get(
+                btn_id, 0) + self._scale(now)
+            self.recent[btn_id] = now
+            self.recent.move_to_end(btn_id)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"id": btn_id, "t": now}) + "\n")
+                self.redundant += 1
+                if self.redundant > USAGE_COMPACT_THRESHOLD:
+                    self.compact()
+            except OSError:
+                pass
+
+    def compact(self):
+        """将日志压缩为每个按钮一行快照，同时重置基准时刻并剔除已衰减殆尽的条目"""
+        now = time.time()
+        scores = {btn_id: weight / self._scale(now)
+                  for btn_id, weight in self.weights.items()}
+        self.origin = now
+        self.weights = {btn_id: score for btn_id, score in scores.items()
+                        if score >= 0.01}
+        for btn_id in [i for i in self.recent if i not in self.weights]:
+            del self.recent[btn_id]
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for btn_id, t in self.recent.items():
+                f.write(json.dumps({
+                    "id": btn_id, "t": now,
+                    "score": self.weights[btn_id]
+                }) + "\n")
+        os.replace(tmp_path, self.path)
+        self.redundant = 0
+
+    def top(self, count, live_ids):
+        """按当前热度从高到低返回仍存在的按钮id"""
+        with self.lock:
+            return [btn_id for btn_id, _ in heapq.nlargest(
+                count,
+                (item for item in self.weights.items() if item[0] in live_ids),
+                key=lambda item: item[1])]
+
+    def most_recent(self, count, live_ids):
+        """按执行时间从近到远返回仍存在的按钮id"""
+        with self.lock:
+            return list(itertools.islice(
+                (btn_id for btn_id in reversed(self.recent)
+                 if btn_id in live_ids), count))
+
+
+class ExecutionJournal:
+    """指令执行日志：每行一条 JSON 记录，缓冲后批量追加，超过大小时轮转"""
+
+    def __init__(self, path, max_bytes=EXECUTION_LOG_MAX_BYTES,
+                 backups=EXECUTION_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer = []
+        self.lock = threading.Lock()
+
+    def record(self, entry):
+        with self.lock:
+            self.buffer.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            full = len(self.buffer) >= EXECUTION_LOG_BUFFER
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            data = "".join(self.buffer).encode('utf-8')
+            self.buffer.clear()
+            try:
+                if (os.path.exists(self.path) and
+                        os.path.getsize(self.path) + len(data) > self.max_bytes):
+                    self._rotate()
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+            except OSError:
+                pass
+
+    def _rotate(self):
+        """execution_log.jsonl -> .1 -> .2 ...，超出保留数量的最旧文件被覆盖"""
+        for idx in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{idx}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{idx + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def files(self):
+        """按从新到旧的顺序返回现有日志文件"""
+        paths = [self.path] + [f"{self.path}.{idx}"
+                               for idx in range(1, self.backups + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+
+def format_log_time(timestamp):
+    """将日志中的纪元秒格式化为本地时间（精确到毫秒）"""
+    if not isinstance(timestamp, (int, float)):
+        return str(timestamp or "")
+    millis = int(timestamp * 1000) % 1000
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) \
+        + f".{millis:03d}"
+
+
+class JournalReader:
+    """从新到旧分页读取执行日志，每次只从文件末尾向前读取所需的数据块"""
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.file_index = 0
+        self.offset = None  # 当前文件中尚未读取部分的结尾位置
+        self.carry = b""  # 数据块开头不完整的一行
+        self.pending = []
+
+    def read_page(self, count=LOG_VIEWER_PAGE):
+        """返回至多 count 条记录（从新到旧），读完时返回空列表"""
+        while len(self.pending) < count and self.file_index < len(self.paths):
+            self._read_block()
+        page, self.pending = self.pending[:count], self.pending[count:]
+        entries = []
+        for line in page:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def _read_block(self):
+        path = self.paths[self.file_index]
+        try:
+            if self.offset is None:
+                self.offset = os.path.getsize(path)
+                self.carry = b""
+            if self.offset == 0:
+                if self.carry:
+                    self.pending.append(self.carry)
+                self.file_index += 1
+                self.offset = None
+                return
+            start = max(0, self.offset - LOG_READ_BLOCK)
+            with open(path, 'rb') as f:
+                f.seek(start)
+                block = f.read(self.offset - start)
+        except OSError:
+            self.file_index += 1
+            self.offset = None
+            return
+        self.offset = start
+        lines = (block + self.carry).split(b"\n")
+        self.carry = lines[0]
+        self.pending.extend(line for line in reversed(lines[1:]) if line)
+
+
+class EditHistory:
+    """撤销/重做历史
+
+    每一步保存一份配置快照，页面快照为 (页面id, 页面名称, 按钮元组)。
+    与上一份快照相同的页面直接复用同一个元组；按钮字典只保存引用，
+    因为按钮修改时总是整体替换字典，从不原地修改。
+    """
+
+    def __init__(self, limit=HISTORY_LIMIT, budget=HISTORY_SLOT_BUDGET):
+        self.limit = limit
+        self.budget = budget
+        self.undo_stack = deque()  # (快照, 占用槽位数)
+        self.redo_stack = []
+        self.slots = 0
+        self.last_pages = {}  # 页面id -> 最近一次快照中的按钮元组
+        self.group_depth = 0
+        self.group_recorded = False
+
+    def snapshot(self, button_data):
+        """生成快照并返回 (快照, 新占用的槽位数)"""
+        pages = []
+        slots = len(button_data)
+        last_pages = {}
+        for page in button_data:
+            buttons = page["buttons"]
+            previous = self.last_pages.get(page["id"])
+            if previous is not None and same_buttons(previous, buttons):
+                page_buttons = previous
+            else:
+                page_buttons = tuple(buttons)
+                slots += len(page_buttons)
+            last_pages[page["id"]] = page_buttons
+            pages.append((page["id"], page["page_name"], page_buttons))
+        self.last_pages = last_pages
+        return tuple(pages), slots
+
+    @staticmethod
+    def restore(snapshot):
+        """由快照还原出可编辑的配置数据"""
+        return [{"id": page_id, "page_name": name, "buttons": list(buttons)}
+                for page_id, name, buttons in snapshot]
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.slots = 0
+
+    def checkpoint(self):
+        """返回最近一条撤销记录，供 discard_after 使用"""
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    def discard_after(self, checkpoint):
+        """丢弃 checkpoint 之后的撤销记录和全部重做记录
+
+        checkpoint 为 None 或已被淘汰时丢弃全部记录。
+        """
+        while self.undo_stack and self.undo_stack[-1] is not checkpoint:
+            self.slots -= self.undo_stack.pop()[1]
+        for _, slots in self.redo_stack:
+            self.slots -= slots
+        self.redo_stack.clear()
+
+    def record(self, button_data):
+        """在修改配置前调用，记录修改前的状态"""
+        if self.group_depth:
+            if self.group_recorded:
+                return
+            self.group_recorded = True
+
+        entry = self.snapshot(button_data)
+        self.undo_stack.append(entry)
+        self.slots += entry[1]
+        for _, slots in self.redo_stack:
+            self.slots -= slots
+        self.redo_stack.clear()
+
+        # 超出步数或内存上限时淘汰最早的记录
+        while self.undo_stack and (len(self.undo_stack) > self.limit
+                                   or self.slots > self.budget):
+            self.slots -= self.undo_stack.popleft()[1]
+
+    def begin_group(self):
+        """开始合并记录（如一次拖动中的多次交换只记为一步）"""
+        if not self.group_depth:
+            self.group_recorded = False
+        self.group_depth += 1
+
+    def end_group(self):
+        self.group_depth = max(0, self.group_depth - 1)
+
+    def undo(self, button_data):
+        """返回要恢复的快照，没有可撤销的记录时返回 None"""
+        return self._step(self.undo_stack, self.redo_stack, button_data)
+
+    def redo(self, button_data):
+        """返回要恢复的快照，没有可重做的记录时返回 None"""
+        return self._step(self.redo_stack, self.undo_stack, button_data)
+
+    def _step(self, source, target, button_data):
+        if not source:
+            return None
+        entry = self.snapshot(button_data)
+        target.append(entry)
+        self.slots += entry[1]
+        snapshot, slots = source.pop()
+        self.slots -= slots
+        return snapshot
+
+
+def acquire_instance_lock():
+    """获取单实例锁，已有实例（包括正在启动的实例）持有时返回 None
+
+    锁在返回的文件对象关闭或进程退出时自动释放。
+    """
+    lock_file = open(runtime_path("lock"), 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class CommandServer:
+    """单实例本地服务
+
+    在后台线程接受命令行客户端的连接，每个连接一行 JSON 请求、一行 JSON 响应。
+    请求须携带启动时写入令牌文件（仅当前用户可读）的随机令牌，
+    通过认证后放入请求队列，由 Tk 主线程定时取出交给 handler 处理；
+    服务线程本身从不调用 Tk。
+    """
+
+    def __init__(self, root, handler):
+        self.root = root
+        self.handler = handler
+        self.requests = queue.Queue()  # (请求, 截止时间, 结果队列)
+        self.sock = None
+        self.address = None
+        self.token = None
+        self.token_path = runtime_path("token")
+
+    def start(self):
+        """启动服务（调用方须已持有单实例锁）"""
+        self.token = secrets.token_hex(16)
+        self._write_token()
+
+        family, address = ipc_address()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            # 持有单实例锁时残留的套接字文件只可能来自异常退出的实例
+            if isinstance(address, str) and os.path.exists(address):
+                os.unlink(address)
+            sock.bind(address)
+            sock.listen(8)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.address = address
+        threading.Thread(target=self._serve, daemon=True).start()
+        self.root.after(IPC_POLL_MS, self._poll)
+
+    def _write_token(self):
+        # 删除后以独占方式重新创建，确保权限为仅当前用户可读写
+        if os.path.exists(self.token_path):
+            os.remove(self.token_path)
+        fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                     0o600)
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(self.token)
+
+    def stop(self):
+        if not self.sock:
+            return
+        self.sock.close()
+        self.sock = None
+        for path in (self.address, self.token_path):
+            if isinstance(path, str) and os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def _serve(self):
+        while self.sock:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    self._handle(conn)
+                except (OSError, ValueError):
+                    pass
+
+    def _handle(self, conn):
+        conn.settimeout(IPC_TIMEOUT)
+        with conn.makefile('r', encoding='utf-8') as f:
+            request = json.loads(f.readline() or "null")
+        if not isinstance(request, dict):
+            response = {"ok": False, "error": "无效的请求"}
+        elif not hmac.compare_digest(
+                str(request.get("token", "")).encode('utf-8'),
+                self.token.encode('utf-8')):
+            response = {"ok": False, "error": "认证失败"}
+        else:
+            result = queue.Queue(maxsize=1)
+            self.requests.put(
+                (request, time.monotonic() + IPC_TIMEOUT, result))
+            try:
+                response = result.get(timeout=IPC_TIMEOUT)
+            except queue.Empty:
+                response = {"ok": False, "error": "主程序无响应"}
+        conn.sendall(json.dumps(response, ensure_ascii=False).encode('utf-8')
+                     + b"\n")
+
+    def _poll(self):
+        """在主线程中处理服务线程转交的请求"""
+        while True:
+            try:
+                request, deadline, result = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            # 客户端已按超时返回的请求不再执行
+            if time.monotonic() < deadline:
+                result.put(self._call(request))
+        if self.sock:
+            self.root.after(IPC_POLL_MS, self._poll)
+
+    def _call(self, request):
+        try:
+            return self.handler(request)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
 
 
 class DraggableButton(ttk.Button):
@@ -39,6 +985,11 @@ class MainApplication:
         self.hotkey_handler = None
         self.load_hotkey_config()
 
+        # 指令模板的命名变量与参数历史
+        self.template_variables = {}
+        self.template_history = {}
+        self.load_template_config()
+
         # 设置主窗口居中
         window_width = 300
         window_height = 450
@@ -53,6 +1004,13 @@ class MainApplication:
 
         # 初始化设置窗口引用
         self.settings_window = None
+        self.frequent_window = None
+        self.frequent_ids = []
+
+        # 使用统计与执行日志
+        self.usage_stats = UsageStats(USAGE_LOG)
+        self.journal = ExecutionJournal(EXECUTION_LOG)
+        self.log_window = None
 
         # 初始化样式系统
         self.init_styles()
@@ -61,6 +1019,21 @@ class MainApplication:
         self.button_data = []
         self.page_scrollable_frames = []
         self.page_canvas = []
+        self._button_index = None
+        self.tray_favorites = []  # 托盘菜单显示的 (按钮id, 名称)，在主线程中生成
+        self.tray_recent = []
+        self.history = EditHistory()
+        self.sharded = False
+        self.active_page = 0
+        self._pending_shards = set()  # 尚在后台加载的页面id
+        self._failed_shards = set()  # 加载失败的页面id（只读，保存时保留原文件）
+        self._saved_pages = {}  # 页面id -> 上次写入分片时的 (名称, 按钮元组)
+        self._saved_manifest = None
+        self._load_generation = 0
+        self._history_checkpoint = None  # 本次加载开始前的最后一条撤销记录
+        self._shard_results = queue.Queue()  # 线程池只向队列投递结果，不直接调用 Tk
+        self._shard_futures = []
+        self._shard_polling = False
         self.load_config()
 
         # 拖动状态
@@ -80,6 +1053,16 @@ class MainApplication:
         self.root.protocol('WM_DELETE_WINDOW', self.hide_to_tray)
         self.register_hotkey()
         self.setup_tab_context_menu()  # 添加这行初始化右键菜单
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.after(EXECUTION_LOG_FLUSH_MS, self.flush_journal)
+
+        # 本地服务（供命令行客户端调用）
+        self.command_server = CommandServer(self.root, self.handle_ipc_request)
+        try:
+            self.command_server.start()
+        except OSError:
+            self.command_server = None
 
     def safe_tkinter_operation(func):
         """防止在组件销毁后执行UI操作的装饰器"""
@@ -128,6 +1111,13 @@ class MainApplication:
     def setup_tray(self):
         """系统托盘设置"""
         menu = pystray.Menu(
+            pystray.MenuItem('常用指令', pystray.Menu(
+                lambda: self.build_tray_command_items(self.tray_favorites))),
+            pystray.MenuItem('最近使用', pystray.Menu(
+                lambda: self.build_tray_command_items(self.tray_recent))),
+            pystray.MenuItem('常用指令窗口', self.show_frequent_window),
+            pystray.MenuItem('执行日志', self.show_log_viewer),
+            pystray.Menu.SEPARATOR,
             pystray.MenuItem('显示', self.show_main_window),
             pystray.MenuItem('设置', self.show_settings),
             pystray.MenuItem('退出', self.exit_app)
@@ -136,6 +1126,29 @@ class MainApplication:
         image = Image.open(icon_path)
         self.tray_icon = pystray.Icon("name", image, "快捷指令-Evelynal", menu)
         threading.Thread(target=self.tray_icon.run, daemon=True).start()
+        self.update_tray_entries()
+
+    def update_tray_entries(self):
+        """在主线程中生成托盘菜单的按钮列表（托盘线程只读取结果，不访问 button_data）"""
+        self.get_button(None)  # 确保索引已建立
+        live = self._button_index
+        self.tray_favorites = [(btn_id, live[btn_id]["name"]) for btn_id
+                               in self.usage_stats.top(FAVORITE_COUNT, live)]
+        self.tray_recent = [(btn_id, live[btn_id]["name"]) for btn_id
+                            in self.usage_stats.most_recent(RECENT_COUNT, live)]
+        if hasattr(self, 'tray_icon'):
+            self.tray_icon.update_menu()
+
+    def build_tray_command_items(self, entries):
+        """根据 (按钮id, 名称) 生成托盘子菜单项（在托盘线程中执行）"""
+        def make_action(btn_id):
+            return lambda: self.root.after(0, self.run_button_by_id, btn_id)
+
+        items = [pystray.MenuItem(name, make_action(btn_id))
+                 for btn_id, name in entries]
+        if not items:
+            items.append(pystray.MenuItem('（暂无记录）', None, enabled=False))
+        return items
 
     def create_scrollable_ui(self):
         """创建分页的可滚动界面"""
@@ -152,8 +1165,10 @@ class MainApplication:
 
         # 如果没有页面则创建默认页
         if not self.button_data:
-            self.button_data.append({"page_name": "默认页", "buttons": []})
+            self.button_data.append(new_page("默认页"))
             self.add_page_ui("默认页")
+        elif 0 < self.active_page < len(self.button_data):
+            self.notebook.select(self.active_page)
 
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
@@ -249,8 +1264,109 @@ class MainApplication:
             command=self.show_add_page_dialog
         )
 
+        # 批量导入导出
+        menu.add_separator()
+        menu.add_command(
+            label="导入指令文件...",
+            command=self.show_import_file_dialog
+        )
+        menu.add_command(
+            label="导入指令文件夹...",
+            command=self.show_import_folder_dialog
+        )
+        menu.add_command(
+            label="导出当前页面...",
+            command=lambda: self.show_export_dialog([tab_index])
+        )
+        menu.add_command(
+            label="导出全部页面...",
+            command=lambda: self.show_export_dialog(
+                range(len(self.button_data)))
+        )
+
         menu.tk_popup(x, y)
 
+    def show_import_file_dialog(self):
+        """选择要导入的指令文件"""
+        path = filedialog.askopenfilename(
+            title="导入指令",
+            filetypes=[("指令文件", "*.mcfunction"), ("配置文件", "*.json"),
+                       ("所有文件", "*.*")]
+        )
+        if path:
+            self.import_commands(path)
+
+    def show_import_folder_dialog(self):
+        """选择要导入的指令文件夹（子目录对应页面）"""
+        path = filedialog.askdirectory(title="导入指令文件夹")
+        if path:
+            self.import_commands(path)
+
+    def import_commands(self, path):
+        """批量导入指令（按规范化指令哈希去重，全部解析完成后统一保存刷新）"""
+        index = {
+            command_hash(btn["command"])
+            for page in self.button_data for btn in page["buttons"]
+        }
+        pending = {}  # 页面名称 -> 待添加的按钮
+        skipped = 0
+        try:
+            for page_name, name, command in iter_import_source(path):
+                key = command_hash(command)
+                if key in index:
+                    skipped += 1
+                    continue
+                index.add(key)
+                pending.setdefault(page_name, []).append({
+                    "id": new_button_id(),
+                    "name": name,
+                    "command": command
+                })
+        except Exception as e:
+            messagebox.showerror("导入失败", f"无法导入指令：{str(e)}")
+            return
+
+        for page_index, page in enumerate(self.button_data):
+            if page["page_name"] in pending and not self.page_editable(page_index):
+                return
+        if pending:
+            self.history.record(self.button_data)
+        pages = {page["page_name"]: page for page in self.button_data}
+        for page_name, buttons in pending.items():
+            if page_name in pages:
+                pages[page_name]["buttons"].extend(buttons)
+            else:
+                self.button_data.append(new_page(page_name, buttons))
+                self.add_page_ui(page_name)
+
+        added = sum(len(buttons) for buttons in pending.values())
+        if added:
+            self.save_config()
+            self.refresh_current_page_buttons()
+        messagebox.showinfo(
+            "导入完成", f"已导入 {added} 条指令，跳过重复指令 {skipped} 条")
+
+    def show_export_dialog(self, page_indexes):
+        """导出页面为 .mcfunction 或 JSON 配置"""
+        path = filedialog.asksaveasfilename(
+            title="导出指令",
+            defaultextension=".mcfunction",
+            filetypes=[("指令文件", "*.mcfunction"), ("配置文件", "*.json")]
+        )
+        if not path:
+            return
+
+        pages = [self.button_data[idx] for idx in page_indexes]
+        try:
+            if path.lower().endswith(".json"):
+                export_json(pages, path)
+            else:
+                export_mcfunction(pages, path)
+        except Exception as e:
+            messagebox.showerror("导出失败", f"无法导出指令：{str(e)}")
+            return
+        messagebox.showinfo("导出完成", f"已导出到 {path}")
+
     def show_page_management(self):
         """显示页面管理对话框"""
         dialog = tk.Toplevel(self.root)
@@ -282,7 +1398,8 @@ class MainApplication:
             if any(page["page_name"] == page_name for page in self.button_data):
                 messagebox.showwarning("错误", "页面名称已存在")
                 return
-            self.button_data.append({"page_name": page_name, "buttons": []})
+            self.history.record(self.button_data)
+            self.button_data.append(new_page(page_name))
             self.add_page_ui(page_name)
             self.save_config()
             dialog.destroy()
@@ -298,6 +1415,7 @@ class MainApplication:
         page_name = self.button_data[tab_index]["page_name"]
         if messagebox.askyesno("确认删除", f"确定删除页面 '{page_name}' 吗？"):
             # 删除数据和UI组件
+            self.history.record(self.button_data)
             del self.button_data[tab_index]
             self.notebook.forget(tab_index)
             del self.page_scrollable_frames[tab_index]
@@ -307,6 +1425,8 @@ class MainApplication:
 
     def show_rename_page_dialog(self, tab_index):
         """显示重命名页面对话框"""
+        if not self.page_editable(tab_index):
+            return
         old_name = self.button_data[tab_index]["page_name"]
 
         dialog = tk.Toplevel(self.root)
@@ -326,6 +1446,7 @@ class MainApplication:
             if any(page["page_name"] == new_name for page in self.button_data):
                 messagebox.showwarning("错误", "页面名称已存在")
                 return
+            self.history.record(self.button_data)
             self.button_data[tab_index]["page_name"] = new_name
             self.notebook.tab(tab_index, text=new_name)
             self.save_config()
@@ -370,9 +1491,15 @@ class MainApplication:
         except (IndexError, tk.TclError):
             return
 
+        # 按钮即将重建，结束进行中的拖动（否则松开事件无法送达，拖动分组不会关闭）
+        self.cancel_drag()
+
         # 清除现有按钮
         for widget in scrollable_frame.winfo_children():
             if isinstance(widget, DraggableButton):
+                after_id = getattr(widget, 'after_id', None)
+                if after_id:
+                    widget.after_cancel(after_id)
                 widget.destroy()
 
         # 获取当前页面的按钮数据
@@ -388,10 +1515,10 @@ class MainApplication:
             btn = DraggableButton(
                 scrollable_frame,
                 text=btn_data["name"],
-                command=lambda cmd=btn_data["command"]: self.safe_execute(
-                    cmd, btn),
                 style="TButton"
             )
+            btn.configure(command=lambda data=btn_data, b=btn: self.safe_execute(
+                data, b))
             btn.data_index = idx
 
             # 计算行列位置
@@ -423,11 +1550,15 @@ class MainApplication:
     def on_drag_start(self, event, button):
         if not self.drag_switch_var.get():
             return
+        current_index = self.get_current_page_index()
+        if current_index is None or not self.page_editable(current_index):
+            return
         button.click_time = time.time()
         button.drag_start_pos = (event.x_root, event.y_root)
         button.after_id = button.after(200, self.start_dragging, button)
 
     def start_dragging(self, button):
+        self.history.begin_group()  # 整个拖动过程只记录一步历史
         button.is_dragging = True
         self.drag_source = button
         self.create_placeholder(button)
@@ -481,6 +1612,7 @@ class MainApplication:
             src_index = self.drag_source.data_index
             tgt_index = target_btn.data_index
 
+            self.history.record(self.button_data)
             buttons[src_index], buttons[tgt_index] = buttons[tgt_index], buttons[src_index]
 
             # 更新按钮索引
@@ -496,13 +1628,25 @@ class MainApplication:
             self.save_config()
 
     def on_drag_end(self, event):
-        if self.drag_source:
-            self.drag_source.after_cancel(
-                getattr(self.drag_source, 'after_id', None))
+        # 长按未满时松开，取消尚未开始的拖动，避免拖动分组悬空
+        after_id = getattr(event.widget, 'after_id', None)
+        if after_id:
+            event.widget.after_cancel(after_id)
+            event.widget.after_id = None
+        self.cancel_drag()
+
+    def cancel_drag(self):
+        """结束当前拖动并关闭对应的历史分组"""
+        if not self.drag_source:
+            return
+        try:
             self.drag_source.configure(style="TButton")
-            self.remove_placeholder()
-            self.drag_source.is_dragging = False
-            self.drag_source = None
+        except tk.TclError:
+            pass
+        self.remove_placeholder()
+        self.drag_source.is_dragging = False
+        self.drag_source = None
+        self.history.end_group()
 
     def create_placeholder(self, button):
         self.drag_placeholder = Frame(button.master,
@@ -519,7 +1663,24 @@ class MainApplication:
             self.drag_placeholder = None
 
     def load_config(self):
-        """加载配置文件（统一使用UTF-8编码）"""
+        """加载配置（存在分片清单时按页面分片加载，否则读取单文件配置）"""
+        self._load_generation += 1
+        self._history_checkpoint = self.history.checkpoint()
+        self._pending_shards = set()
+        self._failed_shards = set()
+        self._saved_pages = {}
+        self._saved_manifest = None
+        self.sharded = os.path.exists(PAGES_MANIFEST)
+        if self.sharded:
+            try:
+                self.load_sharded_config()
+            except Exception as e:
+                messagebox.showerror("配置错误",
+                                     f"分片配置加载失败，已使用默认配置\n错误信息：{str(e)}")
+                self.button_data = [new_page("默认页")]
+            self._button_index = None
+            return
+
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
@@ -529,64 +1690,325 @@ class MainApplication:
                     if not isinstance(data, list):
                         raise ValueError("配置文件格式错误")
 
-                    # 清理无效数据
-                    valid_data = []
-                    for page in data:
-                        if "page_name" in page and "buttons" in page:
-                            valid_buttons = []
-                            for btn in page["buttons"]:
-                                if "name" in btn and "command" in btn:
-                                    valid_buttons.append({
-                                        "name": btn["name"],
-                                        "command": btn["command"]
-                                    })
-                            valid_data.append({
-                                "page_name": page["page_name"],
-                                "buttons": valid_buttons
-                            })
+                    # 清理无效数据（缺少或重复的按钮id重新生成）
+                    valid_data = [page for page in map(validate_page, data)
+                                  if page is not None]
+                    ids_changed = dedupe_button_ids(valid_data, set())
 
                     if not valid_data:
                         raise ValueError("没有有效页面数据")
 
                     self.button_data = valid_data
+                if ids_changed:
+                    # 写回新生成的id，重启后使用记录和托盘列表才能对应到按钮
+                    self.save_config()
             except Exception as e:
                 messagebox.showerror("配置错误",
                                      f"配置文件加载失败，已重置为默认配置\n错误信息：{str(e)}")
-                self.button_data = [{"page_name": "默认页", "buttons": []}]
+                self.button_data = [new_page("默认页")]
                 self.save_config()
         else:
-            self.button_data = [{"page_name": "默认页", "buttons": []}]
+            self.button_data = [new_page("默认页")]
+
+        self._button_index = None
+
+    def load_sharded_config(self):
+        """按清单加载分片：先加载活动页，其余页面在线程池中校验后陆续合入
+
+        后台线程的作用是让主线程先显示活动页、不被其余页面阻塞，
+        而不是多核并行校验（见 SHARD_WORKERS 的说明）。
+        """
+        with open(PAGES_MANIFEST, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        entries = [entry for entry in manifest.get("pages", [])
+                   if isinstance(entry, dict) and entry.get("id")
+                   and "page_name" in entry]
+        if not entries:
+            raise ValueError("没有有效页面数据")
+        active = manifest.get("active", 0)
+        if not isinstance(active, int) or not 0 <= active < len(entries):
+            active = 0
+
+        self.button_data = [
+            {"id": entry["id"], "page_name": entry["page_name"], "buttons": []}
+            for entry in entries
+        ]
+        self.active_page = active
+        self._saved_manifest = self.build_manifest(active)
+        self._pending_shards = {entry["id"] for entry in entries}
+
+        generation = self._load_generation
+        executor = ThreadPoolExecutor(max_workers=SHARD_WORKERS)
+        active_id = entries[active]["id"]
+        active_future = executor.submit(load_shard, active_id)
+        futures = [(executor.submit(load_shard, entry["id"]), entry["id"])
+                   for entry in entries if entry["id"] != active_id]
+        executor.shutdown(wait=False)
+
+        self._shard_futures = [future for future, _ in futures]
+        for future, page_id in futures:
+            future.add_done_callback(
+                lambda f, page_id=page_id: self._shard_results.put(
+                    (generation, page_id, f)))
+        self._apply_shard(generation, active_id, active_future)
+        if not self._shard_polling:
+            self._shard_polling = True
+            self.root.after(SHARD_POLL_MS, self.drain_shard_results)
+
+    def drain_shard_results(self):
+        """在主线程中合入已加载的分片，直到本次加载的全部分片处理完毕"""
+        while True:
+            try:
+                generation, page_id, future = self._shard_results.get_nowait()
+            except queue.Empty:
+                break
+            self._apply_shard(generation, page_id, future)
+
+        if (any(not future.done() for future in self._shard_futures)
+                or not self._shard_results.empty()):
+            self.root.after(SHARD_POLL_MS, self.drain_shard_results)
+        else:
+            self._shard_polling = False
+
+    def _apply_shard(self, generation, page_id, future):
+        """将加载完成的分片合入配置（在主线程中执行）"""
+        if generation != self._load_generation:
+            return
+        page_index = next((idx for idx, page in enumerate(self.button_data)
+                           if page["id"] == page_id), None)
+        if page_index is None:
+            self._pending_shards.discard(page_id)
+            return
+        page = self.button_data[page_index]
+
+        self._pending_shards.discard(page_id)
+        try:
+            loaded = future.result()
+        except Exception as e:
+            # 标记为只读，保存时不会覆盖该页面文件
+            self._failed_shards.add(page_id)
+            messagebox.showerror("配置错误",
+                                 f"页面 '{page['page_name']}' 加载失败，"
+                                 f"修复页面文件并重新加载前该页面不可修改\n"
+                                 f"错误信息：{str(e)}")
+            return
+
+        ids_changed = dedupe_button_ids([loaded], {
+            btn["id"] for other in self.button_data for btn in other["buttons"]})
+        added = page["buttons"]
+        page["buttons"] = loaded["buttons"] + added
+        if not added and not ids_changed:
+            self._saved_pages[page_id] = (
+                loaded["page_name"], tuple(page["buttons"]))
+        else:
+            # 新生成的按钮id和加载期间新增到该页面的按钮都需要写回分片
+            self.save_config()
+        # 加载开始后的快照中该页面不完整，不能再用于撤销；
+        # 加载前的记录（包括重新加载前的状态）保留
+        self.history.discard_after(self._history_checkpoint)
+        self._button_index = None
+        self.update_tray_entries()
+        if self.get_current_page_index() == page_index:
+            self.refresh_current_page_buttons()
 
     def save_config(self):
         """保存配置（统一使用UTF-8编码）"""
+        self._button_index = None
         try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump([{
+            if self.sharded:
+                self.save_sharded_config()
+            else:
+                self.save_single_config()
+        except Exception as e:
+            messagebox.showerror("保存失败", f"无法保存配置：{str(e)}")
+        self.update_tray_entries()
+
+    def save_single_config(self):
+        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+            json.dump([{
+                "page_name": page["page_name"],
+                "buttons": [{
+                    "id": btn["id"],
+                    "name": btn["name"],
+                    "command": btn["command"]
+                } for btn in page["buttons"]]
+            } for page in self.button_data], f, ensure_ascii=False, indent=2)
+
+    def save_sharded_config(self):
+        """只重写内容有变化的页面分片，再更新清单"""
+        os.makedirs(PAGES_DIR, exist_ok=True)
+        saved_pages = {}
+        for page in self.button_data:
+            page_id = page["id"]
+            if page_id in self._pending_shards or page_id in self._failed_shards:
+                continue
+            saved = self._saved_pages.get(page_id)
+            if not (saved and saved[0] == page["page_name"]
+                    and same_buttons(saved[1], page["buttons"])):
+                write_json_atomic(shard_path(page_id), {
                     "page_name": page["page_name"],
                     "buttons": [{
+                        "id": btn["id"],
                         "name": btn["name"],
                         "command": btn["command"]
                     } for btn in page["buttons"]]
-                } for page in self.button_data], f, ensure_ascii=False, indent=2)
+                })
+                saved = (page["page_name"], tuple(page["buttons"]))
+            saved_pages[page_id] = saved
+        self._saved_pages = saved_pages
+        self.save_manifest()
+
+    def build_manifest(self, active=None):
+        if active is None:
+            active = self.get_current_page_index() or 0
+        return {
+            "version": 1,
+            "active": active,
+            "pages": [{"id": page["id"], "page_name": page["page_name"]}
+                      for page in self.button_data]
+        }
+
+    def save_manifest(self):
+        """清单有变化时写入，并删除已不在清单中的页面分片"""
+        manifest = self.build_manifest()
+        if manifest == self._saved_manifest:
+            return
+        write_json_atomic(PAGES_MANIFEST, manifest)
+
+        if self._saved_manifest:
+            current_ids = {page["id"] for page in manifest["pages"]}
+            for entry in self._saved_manifest["pages"]:
+                if entry["id"] not in current_ids:
+                    try:
+                        os.remove(shard_path(entry["id"]))
+                    except OSError:
+                        pass
+        self._saved_manifest = manifest
+
+    def toggle_sharded_storage(self):
+        """在单文件配置与分片存储之间切换"""
+        enable = self.sharded_var.get()
+        if enable == self.sharded:
+            return
+        if self.warn_if_loading():
+            self.sharded_var.set(self.sharded)
+            return
+        failed = [page["page_name"] for page in self.button_data
+                  if page["id"] in self._failed_shards]
+        if failed:
+            messagebox.showwarning(
+                "提示", f"页面 {'、'.join(failed)} 加载失败，切换存储方式会丢失其内容，"
+                        f"请修复页面文件并重新加载后再试")
+            self.sharded_var.set(self.sharded)
+            return
+
+        if enable:
+            self.sharded = True
+            self._saved_pages = {}
+            self._saved_manifest = None
+            self.save_config()
+            return
+
+        try:
+            self.save_single_config()
+            for page in self.button_data:
+                if os.path.exists(shard_path(page["id"])):
+                    os.remove(shard_path(page["id"]))
+            os.remove(PAGES_MANIFEST)
         except Exception as e:
-            messagebox.showerror("保存失败", f"无法保存配置：{str(e)}")
+            messagebox.showerror("保存失败", f"无法切换存储方式：{str(e)}")
+            self.sharded_var.set(True)
+            return
+        self.sharded = False
+        self._saved_pages = {}
+        self._saved_manifest = None
+
+    def warn_if_loading(self):
+        """分片仍在后台加载时提示用户并返回 True"""
+        if not self._pending_shards:
+            return False
+        messagebox.showwarning("提示", "页面尚未全部加载完成，请稍后再试")
+        return True
+
+    def page_editable(self, page_index):
+        """加载失败的分片页面不可修改（修改无法保存），此时提示用户并返回 False"""
+        page = self.button_data[page_index]
+        if page["id"] not in self._failed_shards:
+            return True
+        messagebox.showwarning(
+            "提示", f"页面 '{page['page_name']}' 加载失败，请修复页面文件并重新加载后再修改")
+        return False
+
+    def get_button(self, btn_id):
+        """按id查找按钮配置（索引在配置变化后惰性重建）"""
+        if self._button_index is None:
+            self._button_index = {
+                btn["id"]: btn
+                for page in self.button_data for btn in page["buttons"]
+            }
+        return self._button_index.get(btn_id)
 
-    def safe_execute(self, command, button):
+    def safe_execute(self, btn_data, button):
         if self.drag_switch_var.get():
             return
         if button.valid_click and not button.is_dragging:
-            self.execute_command(command)
+            self.run_command(btn_data["command"], btn_data["id"])
         button.valid_click = True
 
+    def find_button(self, key):
+        """按id或名称查找按钮（名称重复时取第一个）"""
+        btn_data = self.get_button(key)
+        if btn_data:
+            return btn_data
+        return next((btn for page in self.button_data
+                     for btn in page["buttons"] if btn["name"] == key), None)
+
+    def handle_ipc_request(self, request):
+        """处理命令行客户端的请求（在主线程中执行）"""
+        action = request.get("action")
+        if action == "show":
+            self.show_main_window()
+        elif action == "reload":
+            if self._pending_shards:
+                # 此时的快照不完整，无法作为撤销记录
+                return {"ok": False, "error": "页面尚未全部加载完成，请稍后再试"}
+            self.reload_config()
+        elif action == "run":
+            btn_data = self.find_button(str(request.get("button", "")))
+            if not btn_data:
+                return {"ok": False, "error": f"找不到按钮：{request.get('button')}"}
+            values = {str(name): str(value) for name, value
+                      in (request.get("values") or {}).items()}
+            # 先返回响应，指令发送随后在主线程执行
+            self.root.after(0, self.run_command, btn_data["command"],
+                            btn_data["id"], values)
+        else:
+            return {"ok": False, "error": f"未知请求：{action}"}
+        return {"ok": True}
+
+    def reload_config(self):
+        """从磁盘重新加载配置（可撤销，分片存储时撤销记录在分片合入后保留）"""
+        self.history.record(self.button_data)
+        self.load_config()
+        self.sync_pages_ui()
+        self.refresh_current_page_buttons()
+        self.update_tray_entries()
+
+    def run_button_by_id(self, btn_id):
+        """按id执行按钮（托盘菜单、常用指令窗口使用）"""
+        btn_data = self.get_button(btn_id)
+        if btn_data:
+            self.run_command(btn_data["command"], btn_id)
+
     def show_add_dialog(self):
         """显示添加按钮对话框"""
         current_index = self.get_current_page_index()
-        if current_index is None:
+        if current_index is None or not self.page_editable(current_index):
             return
 
         dialog = tk.Toplevel(self.root)
         dialog.title("添加新指令")
-        self.center_window(dialog, 250, 150)
+        self.center_window(dialog, 250, 180)
 
         ttk.Label(dialog, text="按钮名称：").grid(row=0, column=0, padx=5, pady=5)
         name_entry = ttk.Entry(dialog)
@@ -595,12 +2017,15 @@ class MainApplication:
         ttk.Label(dialog, text="执行指令：").grid(row=1, column=0, padx=5, pady=5)
         cmd_entry = ttk.Entry(dialog)
         cmd_entry.grid(row=1, column=1, padx=5, pady=5)
+        self.attach_command_assist(dialog, cmd_entry, row=2)
 
         def add_button():
             name = name_entry.get().strip()
             command = cmd_entry.get().strip()
             if name and command:
+                self.history.record(self.button_data)
                 self.button_data[current_index]["buttons"].append({
+                    "id": new_button_id(),
                     "name": name,
                     "command": command
                 })
@@ -611,9 +2036,105 @@ class MainApplication:
                 messagebox.showwarning("输入错误", "按钮名称和执行指令不能为空")
 
         ttk.Button(dialog, text="确认添加", command=add_button).grid(
-            row=2, column=1, pady=10)
+            row=3, column=1, pady=10)
+
+    def attach_command_assist(self, dialog, entry, row):
+        """为指令输入框添加逐键补全与校验提示（Tab 键补全第一个候选）"""
+        grammar = load_command_grammar()
+        if grammar is None:
+            return
+
+        status = ttk.Label(dialog, wraplength=220)
+        status.grid(row=row, column=0, columnspan=2, padx=5, sticky="w")
+        colors = {True: "green", False: "red", None: "gray"}
+        state = {"completions": [], "partial": ""}
+
+        def update(event=None):
+            valid, message, completions, partial = grammar.analyze(entry.get())
+            state["completions"] = completions
+            state["partial"] = partial
+            status.configure(text=message, foreground=colors[valid])
+
+        def complete(event):
+            if not state["completions"]:
+                return None  # 没有候选时保留 Tab 切换焦点的默认行为
+            text = entry.get()
+            prefix = text[:len(text) - len(state["partial"])]
+            entry.delete(0, tk.END)
+            entry.insert(0, prefix + state["completions"][0] + " ")
+            update()
+            return "break"
+
+        entry.bind("<KeyRelease>", update)
+        entry.bind("<Tab>", complete)
+        update()
+
+    def run_command(self, command, btn_id=None, values=None):
+        """执行按钮指令，模板中缺少的参数先弹窗填写
+
+        values 为调用方直接提供的参数，优先于模板变量。
+        """
+        segments, params = compile_template(command)
+        if not params:
+            self.execute_command(command, btn_id)
+            return
 
-    def execute_command(self, command):
+        provided = {**self.template_variables, **(values or {})}
+        values = {name: provided[name] for name in params if name in provided}
+        missing = [name for name in params if name not in values]
+        if missing:
+            self.show_template_dialog(
+                command, segments, missing, values, btn_id)
+        else:
+            self.execute_command(render_template(segments, values), btn_id)
+
+    def show_template_dialog(self, command, segments, missing, values,
+                             btn_id=None):
+        """显示模板参数填写对话框（下拉框提供最近使用的值）"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("填写参数")
+        self.center_window(dialog, 280, 60 + 35 * len(missing))
+
+        history = self.template_history.get(command, {})
+        entries = {}
+        for row, name in enumerate(missing):
+            ttk.Label(dialog, text=f"{name}：").grid(
+                row=row, column=0, padx=5, pady=5)
+            recent = history.get(name, [])
+            entry = ttk.Combobox(dialog, values=recent)
+            if recent:
+                entry.set(recent[0])
+            entry.grid(row=row, column=1, padx=5, pady=5, sticky="ew")
+            entries[name] = entry
+
+        def confirm():
+            filled = {name: entry.get().strip()
+                      for name, entry in entries.items()}
+            if not all(filled.values()):
+                messagebox.showwarning("输入错误", "参数不能为空")
+                return
+            self.remember_template_args(command, filled)
+            dialog.destroy()
+            self.execute_command(
+                render_template(segments, {**values, **filled}), btn_id)
+
+        ttk.Button(dialog, text="执行", command=confirm).grid(
+            row=len(missing), column=1, pady=10)
+        dialog.bind("<Return>", lambda e: confirm())
+        entries[missing[0]].focus_set()
+
+    def remember_template_args(self, command, filled):
+        """记录模板最近使用的参数值（按模板分别保存）"""
+        history = self.template_history.setdefault(command, {})
+        for name, value in filled.items():
+            recent = [v for v in history.get(name, []) if v != value]
+            recent.insert(0, value)
+            history[name] = recent[:TEMPLATE_HISTORY_LIMIT]
+        self.save_template_config()
+
+    def execute_command(self, command, btn_id=None):
+        start = time.perf_counter()
+        error = None
         try:
             self.root.withdraw()
             pyautogui.hotkey('esc')
@@ -624,7 +2145,155 @@ class MainApplication:
             pyautogui.hotkey('ctrl', 'v')
             pyautogui.press('enter')
         except Exception as e:
-            messagebox.showerror("执行错误", f"指令发送失败：{str(e)}")
+            error = str(e)
+        finally:
+            self.journal.record({
+                "time": round(time.time(), 3),  # 纪元秒（毫秒精度），显示时再格式化
+                "button_id": btn_id,
+                "command": command,
+                "backend": "pyautogui",
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "ok": error is None,
+                "error": error
+            })
+        if error is not None:
+            messagebox.showerror("执行错误", f"指令发送失败：{error}")
+            return
+        if btn_id:
+            self.record_usage(btn_id)
+
+    def flush_journal(self):
+        """定时将缓冲的执行日志写入文件"""
+        self.journal.flush()
+        if not getattr(self, '_is_closing', False):
+            self.root.after(EXECUTION_LOG_FLUSH_MS, self.flush_journal)
+
+    def show_log_viewer(self):
+        self.root.after(0, self._create_log_viewer)
+
+    def _create_log_viewer(self):
+        """创建执行日志窗口（从新到旧，滚动到底部时再读取下一页）"""
+        if self.log_window and self.log_window.winfo_exists():
+            self.log_window.lift()
+            return
+
+        self.log_window = tk.Toplevel(self.root)
+        self.log_window.title("执行日志")
+        self.center_window(self.log_window, 640, 400)
+
+        container = ttk.Frame(self.log_window, padding=10)
+        container.pack(fill=tk.BOTH, expand=True)
+
+        columns = ("time", "button", "command", "duration", "result")
+        tree = ttk.Treeview(container, columns=columns, show="headings")
+        for column, text, width in (("time", "时间", 150), ("button", "按钮", 90),
+                                    ("command", "指令", 220),
+                                    ("duration", "耗时(ms)", 70),
+                                    ("result", "结果", 80)):
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor="w")
+        scrollbar = ttk.Scrollbar(
+            container, orient="vertical", command=tree.yview)
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 1.0:
+                load_page()
+
+        tree.configure(yscrollcommand=on_scroll)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        self.journal.flush()
+        reader = JournalReader(self.journal.files())
+        state = {"exhausted": False}
+
+        def load_page():
+            if state["exhausted"]:
+                return
+            entries = reader.read_page()
+            if not entries:
+                state["exhausted"] = True
+                return
+            for entry in entries:
+                btn_data = self.get_button(entry.get("button_id"))
+                tree.insert("", tk.END, values=(
+                    format_log_time(entry.get("time")),
+                    btn_data["name"] if btn_data else entry.get("button_id") or "",
+                    entry.get("command", ""),
+                    entry.get("duration_ms", ""),
+                    "成功" if entry.get("ok") else entry.get("error") or "失败"
+                ))
+
+        load_page()
+        self.log_window.protocol("WM_DELETE_WINDOW", self._on_log_viewer_close)
+
+    def _on_log_viewer_close(self):
+        if self.log_window:
+            self.log_window.destroy()
+            self.log_window = None
+
+    def record_usage(self, btn_id):
+        """记录按钮使用并增量更新托盘菜单与常用指令窗口"""
+        self.usage_stats.record(btn_id)
+        self.update_tray_entries()
+        self.refresh_frequent_window()
+
+    def show_frequent_window(self):
+        self.root.after(0, self._create_frequent_window)
+
+    def _create_frequent_window(self):
+        """创建常用指令窗口（按使用热度排列）"""
+        if self.frequent_window and self.frequent_window.winfo_exists():
+            self.frequent_window.deiconify()
+            self.frequent_window.lift()
+            return
+
+        self.frequent_window = tk.Toplevel(self.root)
+        self.frequent_window.title("常用指令")
+        self.center_window(self.frequent_window, 200, 320)
+        self.frequent_frame = ttk.Frame(self.frequent_window, padding=10)
+        self.frequent_frame.pack(fill=tk.BOTH, expand=True)
+        self.frequent_window.protocol(
+            "WM_DELETE_WINDOW", self._on_frequent_close)
+
+        self.frequent_ids = []
+        self.refresh_frequent_window()
+
+    @safe_tkinter_operation
+    def refresh_frequent_window(self):
+        """刷新常用指令窗口（排名未变化时不重建按钮）"""
+        if not self.frequent_window or not self.frequent_window.winfo_exists():
+            return
+
+        self.get_button(None)  # 确保索引已建立
+        live = self._button_index
+        entries = [(btn_id, live[btn_id]["name"])
+                   for btn_id in self.usage_stats.top(FAVORITE_COUNT, live)]
+        if entries == self.frequent_ids:
+            return
+        self.frequent_ids = entries
+
+        for widget in self.frequent_frame.winfo_children():
+            widget.destroy()
+        if not entries:
+            ttk.Label(self.frequent_frame, text="暂无使用记录").pack(pady=5)
+        for btn_id, name in entries:
+            ttk.Button(
+                self.frequent_frame,
+                text=name,
+                command=lambda i=btn_id: self.run_frequent_button(i)
+            ).pack(fill=tk.X, pady=2)
+
+    def run_frequent_button(self, btn_id):
+        """从常用指令窗口执行（先隐藏窗口，让焦点回到游戏）"""
+        self.frequent_window.withdraw()
+        self.run_button_by_id(btn_id)
+
+    def _on_frequent_close(self):
+        if self.frequent_window:
+            self.frequent_window.destroy()
+            self.frequent_window = None
 
     def on_right_click(self, event):
         """右键菜单处理"""
@@ -648,6 +2317,8 @@ class MainApplication:
 
     def edit_button(self, button, page_index):
         """修改按钮"""
+        if not self.page_editable(page_index):
+            return
         btn_index = button.data_index
         if btn_index < 0 or btn_index >= len(self.button_data[page_index]["buttons"]):
             messagebox.showerror("错误", "找不到对应的按钮配置")
@@ -657,7 +2328,7 @@ class MainApplication:
 
         dialog = tk.Toplevel(self.root)
         dialog.title("修改按钮")
-        self.center_window(dialog, 300, 180)
+        self.center_window(dialog, 300, 210)
 
         ttk.Label(dialog, text="新名称：").grid(row=0, column=0, padx=5, pady=5)
         name_entry = ttk.Entry(dialog)
@@ -668,6 +2339,7 @@ class MainApplication:
         cmd_entry = ttk.Entry(dialog)
         cmd_entry.insert(0, current_data["command"])
         cmd_entry.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+        self.attach_command_assist(dialog, cmd_entry, row=2)
 
         def save_changes():
             new_name = name_entry.get().strip()
@@ -675,7 +2347,9 @@ class MainApplication:
             if not new_name or not new_cmd:
                 messagebox.showwarning("输入错误", "名称和指令都不能为空")
                 return
+            self.history.record(self.button_data)
             self.button_data[page_index]["buttons"][btn_index] = {
+                "id": current_data["id"],
                 "name": new_name,
                 "command": new_cmd
             }
@@ -684,7 +2358,7 @@ class MainApplication:
             dialog.destroy()
 
         btn_frame = ttk.Frame(dialog)
-        btn_frame.grid(row=2, column=0, columnspan=2, pady=10)
+        btn_frame.grid(row=3, column=0, columnspan=2, pady=10)
         ttk.Button(btn_frame, text="保存", command=save_changes).pack(
             side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(
@@ -692,16 +2366,60 @@ class MainApplication:
 
     def delete_button(self, button, page_index):
         """删除按钮"""
+        if not self.page_editable(page_index):
+            return
         btn_index = button.data_index
         if btn_index < 0 or btn_index >= len(self.button_data[page_index]["buttons"]):
             messagebox.showerror("错误", "找不到对应的按钮配置")
             return
 
         if messagebox.askyesno("确认删除", f"确定要删除按钮 [{button.cget('text')}] 吗？"):
+            self.history.record(self.button_data)
             del self.button_data[page_index]["buttons"][btn_index]
             self.save_config()
             self.refresh_current_page_buttons()
 
+    def undo(self, event=None):
+        """撤销上一步修改（Ctrl+Z）"""
+        if self.drag_source or self.warn_if_loading():
+            return
+        snapshot = self.history.undo(self.button_data)
+        if snapshot is not None:
+            self.restore_snapshot(snapshot)
+
+    def redo(self, event=None):
+        """重做被撤销的修改（Ctrl+Y）"""
+        if self.drag_source or self.warn_if_loading():
+            return
+        snapshot = self.history.redo(self.button_data)
+        if snapshot is not None:
+            self.restore_snapshot(snapshot)
+
+    def restore_snapshot(self, snapshot):
+        """恢复历史快照并保存"""
+        self.button_data = EditHistory.restore(snapshot)
+        self.sync_pages_ui()
+        self.save_config()
+        self.refresh_current_page_buttons()
+
+    def sync_pages_ui(self):
+        """使分页与 button_data 一致（页面结构未变时只更新标签文字）"""
+        tabs = self.notebook.tabs()
+        if len(tabs) == len(self.button_data):
+            for tab_index, page in enumerate(self.button_data):
+                self.notebook.tab(tab_index, text=page["page_name"])
+            return
+
+        current_index = self.get_current_page_index() or 0
+        for tab in tabs:
+            self.notebook.forget(tab)
+            self.root.nametowidget(tab).destroy()
+        self.page_scrollable_frames.clear()
+        self.page_canvas.clear()
+        for page in self.button_data:
+            self.add_page_ui(page["page_name"])
+        self.notebook.select(min(current_index, len(self.button_data) - 1))
+
     def show_settings(self):
         self.root.after(0, self._create_settings_window)
 
@@ -712,7 +2430,7 @@ class MainApplication:
 
         self.settings_window = tk.Toplevel(self.root)
         self.settings_window.title("设置")
-        self.center_window(self.settings_window, 330, 200)
+        self.center_window(self.settings_window, 330, 350)
 
         container = ttk.Frame(self.settings_window, padding=15)
         container.pack(fill=tk.BOTH, expand=True)
@@ -732,6 +2450,29 @@ class MainApplication:
             command=self.save_hotkey_setting
         ).pack(side=tk.LEFT)
 
+        # 存储方式
+        self.sharded_var = tk.BooleanVar(value=self.sharded)
+        ttk.Checkbutton(
+            container,
+            text="按页面分片存储配置",
+            variable=self.sharded_var,
+            command=self.toggle_sharded_storage
+        ).pack(anchor=tk.W, pady=(10, 0))
+
+        # 模板变量设置组件
+        ttk.Label(container, text="模板变量（每行一个 名称=值）:").pack(
+            anchor=tk.W, pady=(10, 0))
+        self.variables_text = tk.Text(container, height=6, width=36)
+        self.variables_text.insert("1.0", "\n".join(
+            f"{name}={value}" for name, value in self.template_variables.items()))
+        self.variables_text.pack(fill=tk.X, pady=5)
+
+        ttk.Button(
+            container,
+            text="保存变量",
+            command=self.save_variables_setting
+        ).pack(anchor=tk.E)
+
         self.settings_window.protocol(
             "WM_DELETE_WINDOW", self._on_settings_close)
 
@@ -766,6 +2507,24 @@ class MainApplication:
         self.register_hotkey()
         messagebox.showinfo("保存成功", "热键设置已更新！")
 
+    def save_variables_setting(self):
+        """保存模板变量设置"""
+        variables = {}
+        for line in self.variables_text.get("1.0", tk.END).splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            name, sep, value = line.partition("=")
+            name = name.strip()
+            if not sep or not VARIABLE_NAME_PATTERN.match(name):
+                messagebox.showerror("格式错误", f"无效的变量定义：{line}")
+                return
+            variables[name] = value.strip()
+
+        self.template_variables = variables
+        self.save_template_config()
+        messagebox.showinfo("保存成功", "模板变量已更新！")
+
     def _on_settings_close(self):
         if self.settings_window:
             self.settings_window.destroy()
@@ -783,6 +2542,13 @@ class MainApplication:
         """退出程序时增加销毁顺序控制"""
         self._is_closing = True  # 标记正在关闭
 
+        # 记录当前页面，下次启动时优先加载
+        if self.sharded:
+            try:
+                self.save_manifest()
+            except OSError:
+                pass
+
         # 先解除事件绑定
         if hasattr(self, 'notebook'):
             self.notebook.unbind("<<NotebookTabChanged>>")
@@ -791,6 +2557,14 @@ class MainApplication:
         if hasattr(self, 'tray_icon'):
             self.tray_icon.stop()
 
+        # 关闭本地服务
+        if getattr(self, 'command_server', None):
+            self.command_server.stop()
+
+        # 写入尚在缓冲中的执行日志
+        if hasattr(self, 'journal'):
+            self.journal.flush()
+
         # 销毁子组件
         if hasattr(self, 'notebook'):
             for child in self.notebook.winfo_children():
@@ -828,6 +2602,28 @@ class MainApplication:
         except Exception as e:
             messagebox.showerror("保存失败", f"无法保存热键配置：{str(e)}")
 
+    def load_template_config(self):
+        """加载模板变量与参数历史"""
+        if os.path.exists(TEMPLATE_CONFIG):
+            try:
+                with open(TEMPLATE_CONFIG, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                    self.template_variables = dict(config.get("variables", {}))
+                    self.template_history = dict(config.get("history", {}))
+            except Exception as e:
+                messagebox.showerror("加载失败", f"模板配置文件错误：{str(e)}")
+
+    def save_template_config(self):
+        """保存模板变量与参数历史"""
+        try:
+            with open(TEMPLATE_CONFIG, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "variables": self.template_variables,
+                    "history": self.template_history
+                }, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            messagebox.showerror("保存失败", f"无法保存模板配置：{str(e)}")
+
     def register_hotkey(self):
         """注册全局热键"""
         if self.hotkey_handler:
@@ -845,5 +2641,15 @@ class MainApplication:
 
 
 if __name__ == "__main__":
-    app = MainApplication()
-    app.run()
+    # 单实例：已有实例在运行（或正在启动）时只唤起其主窗口
+    instance_lock = acquire_instance_lock()
+    if instance_lock is None:
+        for _ in range(10):
+            try:
+                send_request({"action": "show"})
+                break
+            except (OSError, ValueError):
+                time.sleep(0.3)  # 另一个实例可能尚未开始监听
+    else:
+        app = MainApplication()
+        app.run()
@@ -0,0 +1,97 @@
+"""QuickCommand 命令行客户端
+
+通过本地套接字向正在运行的 QuickCommand 发送请求。
+只依赖标准库，不导入 Tk / pyautogui，适合由脚本或 Stream Deck 频繁调用。
+请求需附带运行中实例写入的令牌文件内容，该文件仅当前用户可读。
+
+用法：
+    python QuickCommandCLI.py run <按钮名称或id> [-s 名称=值 ...]
+    python QuickCommandCLI.py show
+    python QuickCommandCLI.py reload
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+IPC_PORT = 47651  # 不支持 Unix 套接字的系统（如 Windows）改用本机 TCP 端口
+IPC_TIMEOUT = 2.0
+
+
+def runtime_path(suffix):
+    """返回当前用户专用的运行时文件路径（Windows 下临时目录本身按用户隔离）"""
+    user = os.environ.get("USER") or os.environ.get("USERNAME") or "user"
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"quickcommand-{user}.{suffix}")
+
+
+def ipc_address():
+    """返回本地服务的 (地址族, 地址)"""
+    if hasattr(socket, "AF_UNIX"):
+        return socket.AF_UNIX, runtime_path("sock")
+    return socket.AF_INET, ("127.0.0.1", IPC_PORT)
+
+
+def read_token():
+    """读取运行中实例的认证令牌，不存在时返回空字符串"""
+    try:
+        with open(runtime_path("token"), 'r', encoding='ascii') as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return ""
+
+
+def send_request(request, timeout=IPC_TIMEOUT):
+    """发送一条请求并返回响应字典，没有正在运行的实例时抛出 OSError"""
+    family, address = ipc_address()
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        request = {**request, "token": read_token()}
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8')
+                     + b"\n")
+        with sock.makefile('r', encoding='utf-8') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("连接已被关闭")
+    return json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="QuickCommandCLI", description="向正在运行的 QuickCommand 发送请求")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    run_parser = subparsers.add_parser("run", help="执行按钮（按名称或id）")
+    run_parser.add_argument("button", help="按钮名称或id")
+    run_parser.add_argument("-s", "--set", action="append", default=[],
+                            metavar="名称=值", help="模板参数，可重复指定")
+    subparsers.add_parser("show", help="显示主窗口")
+    subparsers.add_parser("reload", help="重新加载配置文件")
+
+    args = parser.parse_args(argv)
+    request = {"action": args.action}
+    if args.action == "run":
+        values = {}
+        for item in args.set:
+            name, sep, value = item.partition("=")
+            if not sep or not name.strip():
+                parser.error(f"无效的模板参数：{item}")
+            values[name.strip()] = value
+        request.update(button=args.button, values=values)
+
+    try:
+        response = send_request(request)
+    except (OSError, ValueError) as e:
+        print(f"无法连接到 QuickCommand：{e}", file=sys.stderr)
+        return 2
+    if not response.get("ok"):
+        print(response.get("error", "请求失败"), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())